@@ -0,0 +1,949 @@
+"""
+Core of the Python code analyzer: AST traversal, result types, caching and directory walking.
+
+The `PythonCodeAnalyzer` class uses Python's abstract syntax trees (ASTs) to extract information about functions and
+methods from Python files. This module holds everything the `python_code_analyzer.py` script needs apart from its
+command line interface, in one place, so that it can be compiled ahead of time with mypyc (see setup.py). The script
+works the same whether the compiled extension or this source file is imported.
+
+Functions:
+    analyze_file: Analyze a single Python file with default options.
+    details_as_dicts: Convert analysis results to plain dictionaries for output.
+    iter_python_files: Walk a directory tree and yield the paths of its Python files.
+"""
+
+
+import ast
+import dbm
+import dbm.dumb
+import hashlib
+import inspect
+import os
+import shelve
+import sys
+import tokenize
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Deque, Dict, Any, Callable, Final, Iterable, Iterator, List, Tuple, Union
+
+if sys.platform == 'win32':
+    import msvcrt
+else:
+    import fcntl
+
+try:
+    from mypy_extensions import mypyc_attr
+except ImportError:  # only used as a hint to mypyc; without mypy installed the module is never compiled
+    def mypyc_attr(*attrs: str, **kwattrs: object) -> Callable[[Any], Any]:  # type: ignore[misc]
+        return lambda cls: cls
+
+DEFAULT_CACHE_PATH: Final = os.path.join(os.path.expanduser('~'), '.cache', 'pyanalyzer', 'cache.db')
+
+# Bump whenever the shape of the analysis results changes, so cached results from older versions are not reused
+CACHE_VERSION: Final = 3
+
+# Cache key counting the entries replaced or deleted since the cache was last compacted. Cannot clash with the
+# absolute paths and "sha256:" digests the other entries are stored under.
+_STALE_KEY: Final = 'stale'
+
+# Minimum number of files to parse before analyze_python_directory starts a process pool
+PARALLEL_MIN_FILES: Final = 8
+
+# Number of files parsed per task in the worker pool; fewer, larger tasks cut inter-process round trips
+PARALLEL_CHUNK_FILES: Final = 64
+
+# Number of files analyze_python_directory may look ahead of the last yielded one before it waits for a result
+DIRECTORY_LOOKAHEAD: Final = 256
+
+# Statements that generic_visit dispatches; everything else in a module or class body is skipped without a visit
+_DEFINITION_TYPES: Final = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def _annotation(node: Optional[ast.AST]) -> Optional[str]:
+    """
+    Render an annotation as source code.
+
+    Plain names, dotted names and simple literals cover most annotations and are rendered directly; anything else
+    falls back to `ast.unparse`, which produces the same text but runs a full code generator.
+
+    Args:
+        node (Optional[ast.AST]): The annotation node, if any.
+
+    Returns:
+        Optional[str]: The annotation source, or None if there is no annotation.
+    """
+    if node is None:
+        return None
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute) and type(node.value) in (ast.Name, ast.Attribute):
+        return f"{_annotation(node.value)}.{node.attr}"
+    if isinstance(node, ast.Constant) and node.kind is None and (node.value is None or type(node.value) in (str, int, bool)):
+        return repr(node.value)
+    return ast.unparse(node)
+
+
+def _fast_docstring(node: Union[ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Module]) -> Optional[str]:
+    """
+    Return the cleaned docstring of a function, class or module node.
+
+    Equivalent to `ast.get_docstring(node)`, with the checks inlined for the common case. One-line docstrings, which
+    have no indentation to remove, skip `inspect.cleandoc` too.
+
+    Args:
+        node (Union[ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Module]): The node whose docstring to read.
+
+    Returns:
+        Optional[str]: The docstring, or None if there is none.
+    """
+    if node.body:
+        first = node.body[0]
+        if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str):
+            docstring = first.value.value
+            if '\n' not in docstring:
+                return docstring.expandtabs().lstrip()
+            return inspect.cleandoc(docstring)
+    return None
+
+
+@mypyc_attr(allow_interpreted_subclasses=True)
+@dataclass(slots=True)
+class FuncInfo:
+    """
+    Details of a single function or method.
+
+    Attributes:
+        args (Dict[str, Optional[str]]): Positional argument names mapped to their annotations.
+        returns (Optional[str]): The return annotation.
+        docstring (Optional[str]): The docstring.
+        dependencies (List[str]): Names of the functions/methods called in the body.
+        entry_point (bool): Whether the function is a module-level function named "__main__".
+    """
+    args: Dict[str, Optional[str]]
+    returns: Optional[str]
+    docstring: Optional[str]
+    dependencies: List[str]
+    entry_point: bool
+
+    def as_dict(self, exclude_docstrings: bool = False, focus_docstrings: bool = False) -> Dict[str, Any]:
+        """
+        Convert to the dictionary form printed by the script.
+
+        Args:
+            exclude_docstrings (bool, optional): Leave out the docstring. Defaults to False.
+            focus_docstrings (bool, optional): Only keep the docstring. Defaults to False.
+
+        Returns:
+            Dict[str, Any]: The function details.
+        """
+        if focus_docstrings:
+            return {'docstring': self.docstring}
+        details = {'args': self.args, 'return': self.returns, 'docstring': self.docstring,
+                   'dependencies': self.dependencies, 'entry_point': self.entry_point}
+        if exclude_docstrings:
+            del details['docstring']
+        return details
+
+
+def _leading_string(filepath: str) -> Tuple[bool, Optional[str]]:
+    """
+    Read the string literal a Python file starts with, tokenizing only as far as its first statement.
+
+    Args:
+        filepath (str): The path to the Python file.
+
+    Returns:
+        Tuple[bool, Optional[str]]: Whether the tokens settled the question, and if so the string the first statement
+        consists of, or None if it is not a plain string literal. Parenthesized literals, f-strings on newer Pythons
+        and unreadable files are left to the parser.
+    """
+    strings = []
+    with open(filepath, 'rb') as file:
+        try:
+            for tok in tokenize.tokenize(file.readline):
+                if tok.type in (tokenize.ENCODING, tokenize.NL, tokenize.COMMENT):
+                    continue
+                if tok.type == tokenize.STRING:
+                    strings.append(tok.string)
+                    continue
+                if strings:
+                    if tok.type == tokenize.NEWLINE or (tok.type == tokenize.OP and tok.string == ';'):
+                        break
+                    # The literal is only part of a larger expression, e.g. "..." % args
+                    return True, None
+                if tok.type in (tokenize.NAME, tokenize.NUMBER, tokenize.ENDMARKER) or (
+                        tok.type == tokenize.OP and tok.string != '('):
+                    return True, None
+                return False, None
+        except (tokenize.TokenError, SyntaxError):
+            return False, None
+
+    if any('f' in string[:len(string) - len(string.lstrip('rRbBuUfF'))].lower() for string in strings):
+        return True, None
+    try:
+        value = ast.literal_eval(' '.join(strings))
+    except (SyntaxError, ValueError):
+        return False, None
+    return True, value if isinstance(value, str) else None
+
+
+def details_as_dicts(func_details: Dict[str, Any], exclude_docstrings: bool = False,
+                     focus_docstrings: bool = False) -> Dict[str, Any]:
+    """
+    Convert the result of an analysis to plain dictionaries for output.
+
+    Args:
+        func_details (Dict[str, Any]): Function/method details as returned by `PythonCodeAnalyzer.analyze_python_file`.
+        exclude_docstrings (bool, optional): Leave out docstrings. Defaults to False.
+        focus_docstrings (bool, optional): Only keep docstrings. Defaults to False.
+
+    Returns:
+        Dict[str, Any]: The same details with every `FuncInfo` converted by `FuncInfo.as_dict`.
+    """
+    return {name: info.as_dict(exclude_docstrings, focus_docstrings) if isinstance(info, FuncInfo) else info
+            for name, info in func_details.items()}
+
+
+@mypyc_attr(allow_interpreted_subclasses=True)
+class PythonCodeAnalyzer(ast.NodeVisitor):
+    def __init__(self, include_class_attrs: bool = True, cache_path: Optional[str] = None,
+                 include_docstrings: bool = True, docstrings_only: bool = False):
+        """
+        Initialize the PythonCodeAnalyzer.
+
+        Args:
+            include_class_attrs (bool, optional): Whether to include class attributes in the analysis. Defaults to True.
+            cache_path (str, optional): Path of an on-disk cache of analysis results, reused across runs for files
+                whose modification time and size are unchanged. Defaults to None (results are only cached in memory).
+            include_docstrings (bool, optional): Whether to extract docstrings. When False, every docstring is None.
+                Defaults to True.
+            docstrings_only (bool, optional): Only extract docstrings, for output that shows nothing else. Arguments,
+                return annotations and dependencies are then left empty instead of being rendered. Defaults to False.
+
+        Raises:
+            ValueError: If docstrings are both excluded and the only thing extracted.
+        """
+        if docstrings_only and not include_docstrings:
+            raise ValueError("include_docstrings=False and docstrings_only=True cannot be used together")
+
+        self.include_class_attrs = include_class_attrs
+        self.include_docstrings = include_docstrings
+        self.docstrings_only = docstrings_only
+        self.cache_path = cache_path
+        self._memo: Dict[str, Tuple[tuple, Dict[str, Any]]] = {}
+        self._cache: Optional[shelve.Shelf] = None
+        # Descriptor of the locked "<cache_path>.lock" file while the cache is open; dbm backends do no locking
+        self._cache_lock: Optional[int] = None
+        # Real path -> (modification time, size, module) of the files parsed by analyze_python_file and
+        # get_module_docstring, so asking for both parses a file once. Long-running callers can release the trees with
+        # clear_parse_cache().
+        self._parsed_cache: Dict[str, Tuple[int, int, ast.Module]] = {}
+
+        # Traversal state, reset for every analyzed node
+        self.out: Dict[str, Any] = {}
+        self.class_stack: List[str] = []
+
+        # Node type -> bound visitor method, so dispatch is a dict lookup instead of building 'visit_<name>' per node
+        self._visit_cache: Dict[type, Callable[[Any], None]] = {
+            ast.ClassDef: self.visit_ClassDef,
+            ast.FunctionDef: self.visit_FunctionDef,
+            ast.AsyncFunctionDef: self.visit_AsyncFunctionDef,
+        }
+
+    def _open_cache(self) -> Optional[shelve.Shelf]:
+        """
+        Open the on-disk cache on first use.
+
+        Returns:
+            Optional[shelve.Shelf]: The cache, or None if no cache path is set or it cannot be opened
+            (e.g. because another run holds its lock).
+        """
+        if self._cache is None and self.cache_path:
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                self._cache_lock = _lock_file(self.cache_path + '.lock')
+                self._cache = shelve.open(self.cache_path)
+            except dbm.error:  # includes OSError
+                self._release_cache_lock()
+                self.cache_path = None
+        return self._cache
+
+    def _release_cache_lock(self) -> None:
+        """
+        Release the lock on the on-disk cache, if held.
+        """
+        if self._cache_lock is not None:
+            _unlock_file(self._cache_lock)
+            self._cache_lock = None
+
+    def close(self) -> None:
+        """
+        Write out and close the on-disk cache, if one is open, compacting it once it holds more stale entries than
+        live ones.
+        """
+        if self._cache is not None:
+            cache = self._cache
+            self._cache = None
+            compact = cache.get(_STALE_KEY, 0) > len(cache)
+            cache.close()
+            if compact:
+                self._compact_cache()
+        self._release_cache_lock()
+
+    def _compact_cache(self) -> None:
+        """
+        Rewrite a dbm.dumb cache with only its live entries.
+
+        dbm.dumb never reuses the space of replaced or deleted entries, so its data file would otherwise keep growing.
+        The other dbm backends reuse it themselves and are left alone.
+        """
+        if self.cache_path is None or dbm.whichdb(self.cache_path) != 'dbm.dumb':
+            return
+        tmp = self.cache_path + '.compact'
+        old = dbm.dumb.open(self.cache_path, 'r')
+        new = dbm.dumb.open(tmp, 'n')
+        try:
+            for key in old.keys():
+                if key != _STALE_KEY.encode():
+                    new[key] = old[key]
+        finally:
+            old.close()
+            new.close()
+        for suffix in ('.dat', '.dir'):
+            os.replace(tmp + suffix, self.cache_path + suffix)
+        if os.path.exists(tmp + '.bak'):
+            os.remove(tmp + '.bak')
+
+    def clear_parse_cache(self) -> None:
+        """
+        Drop the syntax trees kept so that `analyze_python_file` and `get_module_docstring` parse a file only once.
+
+        Analysis results stay cached; only the memory held by the parsed modules is released.
+        """
+        self._parsed_cache.clear()
+
+    def get_func_details(self, node: ast.AST) -> Dict[str, Any]:
+        """
+        Traverse an AST node once to extract function/method details.
+
+        Args:
+            node (ast.AST): The AST node to analyze.
+
+        Returns:
+            Dict[str, Any]: A dictionary with function/method details.
+        """
+        self.out = {}
+        self.class_stack = []
+        self.visit(node)
+        return self.out
+
+    def visit(self, node: ast.AST) -> Any:
+        """
+        Dispatch a node to its visitor method through the per-type cache.
+
+        Args:
+            node (ast.AST): The node to visit.
+        """
+        node_type = type(node)
+        visitor = self._visit_cache.get(node_type)
+        if visitor is None:
+            visitor = self._visit_cache[node_type] = getattr(self, 'visit_' + node_type.__name__, self.generic_visit)
+        return visitor(node)
+
+    def generic_visit(self, node: ast.AST) -> None:
+        """
+        Visit the function and class definitions directly in the body of a module or class.
+
+        Definitions nested in other statements, such as `if`, `try` or `with` blocks, are not reported, and the
+        expressions that make up most of a tree are never dispatched.
+
+        Args:
+            node (ast.AST): The module or class node whose body to visit.
+        """
+        for item in getattr(node, 'body', ()):
+            if type(item) in _DEFINITION_TYPES:
+                self.visit(item)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        """
+        Collect the methods of a class and, if enabled, its class attributes.
+
+        Args:
+            node (ast.ClassDef): The ClassDef node to handle.
+        """
+        self.class_stack.append(node.name)
+        self.generic_visit(node)
+        self.class_stack.pop()
+        if self.include_class_attrs:
+            self.out['class_attributes'] = [ast.unparse(attr) for attr in node.body if isinstance(attr, ast.Assign)]
+
+    def visit_FunctionDef(self, node: Union[ast.FunctionDef, ast.AsyncFunctionDef]) -> None:
+        """
+        Record the details of a function or method, including the names it calls.
+
+        Nested functions are not recorded separately; the calls they make count as dependencies of the enclosing function.
+
+        Args:
+            node (Union[ast.FunctionDef, ast.AsyncFunctionDef]): The FunctionDef or AsyncFunctionDef node to handle.
+        """
+        class_name = self.class_stack[-1] if self.class_stack else None
+        func_name = f"{class_name}.{node.name}" if class_name else node.name
+        if self.docstrings_only:
+            self.out[func_name] = FuncInfo(args={}, returns=None, docstring=_fast_docstring(node), dependencies=[],
+                                           entry_point=class_name is None and node.name == '__main__')
+            return
+        self.out[func_name] = FuncInfo(
+            args={arg.arg: _annotation(arg.annotation) for arg in node.args.args} if node.args.args else {},
+            returns=_annotation(node.returns),
+            docstring=_fast_docstring(node) if self.include_docstrings else None,
+            dependencies=self._dependencies(node),
+            entry_point=class_name is None and node.name == '__main__',
+        )
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef) -> None:
+        """
+        Record the details of an async function or method, exactly as for a regular one.
+
+        Args:
+            node (ast.AsyncFunctionDef): The AsyncFunctionDef node to handle.
+        """
+        self.visit_FunctionDef(node)
+
+    @staticmethod
+    def _dependencies(node: Union[ast.FunctionDef, ast.AsyncFunctionDef]) -> List[str]:
+        """
+        List the names called anywhere in a function body, in order of first appearance.
+
+        Each statement is walked breadth first, in the same order as `ast.walk`, but without its generator per node;
+        node types are compared by identity, which the parser's nodes allow.
+
+        Args:
+            node (Union[ast.FunctionDef, ast.AsyncFunctionDef]): The function node.
+
+        Returns:
+            List[str]: The called function/method names.
+        """
+        dependencies: Dict[str, None] = {}
+        for stmt in node.body:
+            todo: List[ast.AST] = [stmt]
+            # The list grows while it is iterated, which visits the nodes in the order they were queued
+            for sub_node in todo:
+                if type(sub_node) is ast.Call:
+                    func = sub_node.func
+                    if type(func) is ast.Name:
+                        dependencies[func.id] = None
+                    elif type(func) is ast.Attribute:
+                        dependencies[func.attr] = None
+                for field in sub_node._fields:
+                    value = getattr(sub_node, field, None)
+                    if type(value) is list:
+                        for item in value:
+                            if isinstance(item, ast.AST):
+                                todo.append(item)
+                    elif isinstance(value, ast.AST):
+                        todo.append(value)
+        return list(dependencies)
+
+    def analyze_python_file(self, filepath: str) -> Dict[str, Any]:
+        """
+        Analyze a Python file and extract details about its functions, methods, dependencies, and entry points.
+
+        Args:
+            filepath (str): The path to the Python file.
+
+        Returns:
+            Dict[str, Any]: A dictionary with function/method details.
+
+        Raises:
+            ValueError: If the file does not exist, is not a Python file, cannot be read, or contains syntax errors.
+        """
+        if not os.path.isfile(filepath):
+            raise ValueError(f"{filepath} does not exist")
+
+        if not filepath.endswith('.py'):
+            raise ValueError(f"{filepath} is not a Python file")
+
+        try:
+            key, stamp, digest, func_details = self._cache_lookup(filepath)
+        except OSError as e:
+            raise _read_error(filepath, e)
+        if func_details is None:
+            hash_source = self._cache is not None and digest is None
+            func_details, source_digest = self._analyze_uncached(filepath, True, hash_source)
+            self._cache_store(key, stamp, digest or source_digest, func_details)
+        return func_details
+
+    def analyze_python_directory(self, directory: str, include_venv: bool = False, workers: Optional[int] = None,
+                                 exclude_dirs: Iterable[str] = ()) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Analyze every Python file under a directory.
+
+        Files are looked up in the cache as the walk reaches them. Once PARALLEL_MIN_FILES of them have no cached
+        result, those and all later misses are parsed in a pool of worker processes, since parsing is CPU bound and
+        independent per file; fewer misses are parsed in-process. Results are yielded in walk order as soon as they are
+        available, so output starts before the walk is complete.
+
+        Args:
+            directory (str): The directory to analyze.
+            include_venv (bool, optional): Whether to include venv directories. Defaults to False.
+            workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+            exclude_dirs (Iterable[str], optional): Names of directories to skip, wherever they occur. Defaults to ().
+
+        Yields:
+            Tuple[str, Dict[str, Any]]: The path of each Python file and its function/method details, in walk order.
+
+        Raises:
+            ValueError: If a file cannot be read (e.g. a dangling symlink) or contains syntax errors. The files before
+            it in walk order have been yielded by then.
+        """
+        workers = workers or os.cpu_count() or 1
+        executor: Optional[ProcessPoolExecutor] = None
+        # Files looked up but not yielded yet, in walk order, as [filepath, key, stamp, digest, result, index]. The
+        # result is the cached details, the error to raise, None for a miss not handed to the pool, or the Future of the
+        # pool task the miss was sent with, holding its result at position index.
+        pending: Deque[List[Any]] = deque()
+        # Misses waiting to be sent to the pool (or parsed in-process if it never starts), in walk order
+        batch: Deque[List[Any]] = deque()
+
+        try:
+            for filepath in iter_python_files(directory, include_venv, exclude_dirs):
+                try:
+                    job: List[Any] = [filepath, *self._cache_lookup(filepath), 0]
+                except OSError as e:
+                    job = [filepath, None, None, None, _read_error(filepath, e), 0]
+                pending.append(job)
+                if job[4] is None and workers > 1:
+                    batch.append(job)
+
+                    # A handful of files is parsed faster in-process than it takes to start the pool
+                    if executor is None and len(batch) >= PARALLEL_MIN_FILES:
+                        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                       initargs=(self.include_class_attrs, self.include_docstrings,
+                                                                 self.docstrings_only, self._cache is not None))
+                        _submit_batch(executor, batch)
+                    elif executor is not None and len(batch) >= PARALLEL_CHUNK_FILES:
+                        _submit_batch(executor, batch)
+
+                # Yield what is ready. A miss is held back while the pool may still start or its batch fill up, and a
+                # pool result is waited for, only until the walk has run DIRECTORY_LOOKAHEAD files ahead of the output.
+                while pending:
+                    result = pending[0][4]
+                    if len(pending) <= DIRECTORY_LOOKAHEAD and (
+                            (result is None and workers > 1) or (isinstance(result, Future) and not result.done())):
+                        break
+                    if result is None and executor is not None:
+                        _submit_batch(executor, batch)
+                    elif result is None and batch:
+                        batch.popleft()
+                    yield self._finish_job(pending.popleft())
+
+            if executor is not None and batch:
+                _submit_batch(executor, batch)
+            while pending:
+                yield self._finish_job(pending.popleft())
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def _finish_job(self, job: List[Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Complete the analysis of one file queued by `analyze_python_directory` and cache a fresh result.
+
+        Args:
+            job (List[Any]): The queued [filepath, key, stamp, digest, result, index] entry.
+
+        Returns:
+            Tuple[str, Dict[str, Any]]: The path of the file and its function/method details.
+
+        Raises:
+            ValueError: If the file cannot be read or contains syntax errors.
+        """
+        filepath, key, stamp, digest, result, index = job
+        if isinstance(result, dict):
+            return filepath, result
+        if result is None:
+            result = self._analyze_uncached(filepath, False, self._cache is not None and digest is None)
+        elif isinstance(result, Future):
+            result = result.result()[index]
+        if isinstance(result, Exception):
+            raise result
+        func_details, source_digest = result
+        self._cache_store(key, stamp, digest or source_digest, func_details)
+        return filepath, func_details
+    def _cache_lookup(self, filepath: str) -> Tuple[str, tuple, Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Look up the cached analysis of a file.
+
+        Results are reused while the file's modification time and size, the analysis options and the Python version
+        are unchanged. When a file analyzed before under the same path has a new stamp, e.g. after a checkout or a
+        touch, its contents are hashed and the analysis of identical contents is reused instead of parsing again. Files
+        seen for the first time are not hashed here; their digest is taken from the bytes read to parse them.
+
+        Args:
+            filepath (str): The path to the Python file.
+
+        Returns:
+            Tuple[str, tuple, Optional[str], Optional[Dict[str, Any]]]: The cache key, the file's current stamp, the
+            SHA-256 digest of its contents (None unless the path had an outdated entry), and the cached function/method
+            details or None on a miss.
+        """
+        key = os.path.abspath(filepath)
+        st = os.stat(filepath)
+        options = (CACHE_VERSION, sys.version_info[:2], self.include_class_attrs, self.include_docstrings,
+                   self.docstrings_only)
+        stamp = options + (st.st_mtime_ns, st.st_size)
+
+        # Memo entries are (stamp, details); cache path entries also carry the digest of the contents
+        cached: Optional[tuple] = self._memo.get(key)
+        cache = self._open_cache()
+        if cached is None and cache is not None:
+            cached = self._cache_get(cache, key)
+        if cached is not None and cached[0] == stamp:
+            self._memo[key] = cached
+            return key, stamp, None, cached[1]
+        if cache is None or cached is None:
+            return key, stamp, None, None
+
+        with open(filepath, 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        cached = self._cache_get(cache, f"sha256:{digest}")
+        if cached is not None and cached[0] == options:
+            # Same contents as an analyzed file; record it under this path and stamp so the next run only needs a stat
+            self._cache_store(key, stamp, digest, cached[1])
+            return key, stamp, digest, cached[1]
+        return key, stamp, digest, None
+
+    @staticmethod
+    def _cache_get(cache: shelve.Shelf, key: str) -> Optional[tuple]:
+        """
+        Read an entry from the on-disk cache.
+
+        Args:
+            cache (shelve.Shelf): The open cache.
+            key (str): The entry key.
+
+        Returns:
+            Optional[tuple]: The entry, or None if it is missing or unreadable.
+        """
+        try:
+            return cache.get(key)
+        except Exception:
+            # An unreadable entry, e.g. pickled by an incompatible version of this module, is just a miss
+            return None
+
+    def _cache_store(self, key: str, stamp: tuple, digest: Optional[str], func_details: Dict[str, Any]) -> None:
+        """
+        Store the analysis of a file in the memo and the on-disk cache.
+
+        The path entry records the digest its analysis is also stored under. When a path entry is replaced, the
+        content entry of the file's previous contents is deleted, so the cache only holds entries for contents that
+        are still on disk somewhere (a copy of the old contents just misses once and is stored again).
+
+        Args:
+            key (str): The cache key returned by `_cache_lookup`.
+            stamp (tuple): The file stamp returned by `_cache_lookup`.
+            digest (Optional[str]): The content digest returned by `_cache_lookup`; if set, the analysis is also stored
+                under it for files with the same contents.
+            func_details (Dict[str, Any]): The function/method details to store.
+        """
+        self._memo[key] = (stamp, func_details)
+        cache = self._open_cache()
+        if cache is None:
+            return
+        old = self._cache_get(cache, key)
+        cache[key] = (stamp, func_details, digest)
+        if digest is not None:
+            cache[f"sha256:{digest}"] = (stamp[:-2], func_details)
+        if old is None:
+            return
+
+        stale = 1
+        old_digest = old[2] if len(old) > 2 else None
+        if old_digest is not None and old_digest != digest:
+            try:
+                del cache[f"sha256:{old_digest}"]
+                stale += 1
+            except KeyError:
+                # Already deleted for another path with the same contents
+                pass
+        cache[_STALE_KEY] = cache.get(_STALE_KEY, 0) + stale
+
+    def _get_module(self, filepath: str, keep: bool = True,
+                    hash_source: bool = False) -> Tuple[ast.Module, Optional[str]]:
+        """
+        Parse a Python file, reusing the module parsed earlier if the file has not changed since.
+
+        Args:
+            filepath (str): The path to the Python file.
+            keep (bool, optional): Whether to keep a newly parsed module for later calls. Defaults to True.
+            hash_source (bool, optional): Whether to also return the SHA-256 digest of the file's contents, taken from
+                the bytes that are parsed. Defaults to False.
+
+        Returns:
+            Tuple[ast.Module, Optional[str]]: The parsed module, and the digest if `hash_source` is set.
+
+        Raises:
+            SyntaxError: If the file contains syntax errors.
+        """
+        key = os.path.realpath(filepath)
+        st = os.stat(key)
+        cached = self._parsed_cache.get(key)
+        reuse = cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size
+        if cached is not None and reuse and not hash_source:
+            return cached[2], None
+
+        # Parse the raw bytes; the parser honours the PEP 263 coding cookie itself, so no separate decode pass is needed
+        with open(key, 'rb') as file:
+            source = file.read()
+        digest = hashlib.sha256(source).hexdigest() if hash_source else None
+        if cached is not None and reuse:
+            return cached[2], digest
+        module = ast.parse(source, filename=filepath)
+        if keep:
+            self._parsed_cache[key] = (st.st_mtime_ns, st.st_size, module)
+        return module, digest
+
+    def _analyze_uncached(self, filepath: str, keep: bool = False,
+                          hash_source: bool = False) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Parse a Python file and extract its function/method details, bypassing the cache.
+
+        Args:
+            filepath (str): The path to the Python file.
+            keep (bool, optional): Whether to keep the parsed module for `get_module_docstring`. Directory walks leave
+                this off so that the trees of a whole project are not held in memory. Defaults to False.
+            hash_source (bool, optional): Whether to also return the SHA-256 digest of the file's contents, for the
+                on-disk cache. Defaults to False.
+
+        Returns:
+            Tuple[Dict[str, Any], Optional[str]]: A dictionary with function/method details, and the digest if
+            `hash_source` is set.
+
+        Raises:
+            ValueError: If the file cannot be read or contains syntax errors.
+        """
+        try:
+            module, digest = self._get_module(filepath, keep, hash_source)
+        except SyntaxError as e:
+            raise ValueError(f"{filepath} contains syntax errors: {str(e)}")
+        except OSError as e:
+            raise _read_error(filepath, e)
+
+        return self.get_func_details(module), digest
+    
+    def get_module_docstring(self, filepath: str) -> Optional[str]:
+        """
+        Get the module-level docstring from a Python file.
+
+        This approach only works for module-level docstrings that are defined as 
+        a string literal at the top of the file. It won't work for docstrings that 
+        are dynamically generated or assigned to a variable before being assigned 
+        to __doc__. However, such practices are rare and not recommended.
+
+        Only the tokens up to the end of the first statement are read; the file is parsed only if they are not enough
+        to tell whether it is a string literal, or if it has already been parsed.
+
+        Args:
+            filepath (str): The path to the Python file.
+
+        Returns:
+            Optional[str]: The module-level docstring, if it exists. Otherwise, None.
+            """
+
+        if os.path.realpath(filepath) not in self._parsed_cache:
+            settled, docstring = _leading_string(filepath)
+            if settled:
+                return docstring
+
+        module, _ = self._get_module(filepath)
+
+        if module.body:
+            first = module.body[0]
+            if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str):
+                return first.value.value
+        
+        return None
+
+
+def _read_error(filepath: str, error: OSError) -> ValueError:
+    """
+    Describe a file that could not be stat'ed or read as the ValueError the analyzer raises for it.
+
+    Args:
+        filepath (str): The path to the Python file.
+        error (OSError): The error raised by the filesystem.
+
+    Returns:
+        ValueError: "does not exist" for a missing file, e.g. a dangling symlink or a file deleted since it was listed,
+        and "cannot be read" with the reason otherwise.
+    """
+    if isinstance(error, FileNotFoundError):
+        return ValueError(f"{filepath} does not exist")
+    return ValueError(f"{filepath} cannot be read: {error.strerror or error}")
+
+
+def _lock_file(path: str) -> int:
+    """
+    Open a lock file and lock it exclusively, without waiting for another process to release it.
+
+    Args:
+        path (str): The path of the lock file; it is created if missing.
+
+    Returns:
+        int: The descriptor of the locked file, to pass to `_unlock_file`.
+
+    Raises:
+        OSError: If the file cannot be opened or another process holds the lock.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if sys.platform == 'win32':
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        raise
+    return fd
+
+
+def _unlock_file(fd: int) -> None:
+    """
+    Release and close a lock file opened by `_lock_file`.
+
+    Args:
+        fd (int): The descriptor of the locked file.
+    """
+    if sys.platform == 'win32':
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    os.close(fd)
+
+
+def analyze_file(filepath: str) -> Dict[str, Any]:
+    """
+    Analyze a single Python file with the default options and no on-disk cache.
+
+    Args:
+        filepath (str): The path to the Python file.
+
+    Returns:
+        Dict[str, Any]: A dictionary with function/method details.
+
+    Raises:
+        ValueError: If the file does not exist, is not a Python file, or contains syntax errors.
+    """
+    return PythonCodeAnalyzer().analyze_python_file(filepath)
+
+
+def iter_python_files(directory: str, include_venv: bool = False, exclude_dirs: Iterable[str] = ()) -> Iterator[str]:
+    """
+    Walk a directory tree with `os.scandir` and yield the paths of its Python files.
+
+    Entries are classified from the cached directory entry type, so only `.py` names ever cost an extra stat.
+    Symlinked directories and `__pycache__` directories are not entered. Unless venv directories are included,
+    subdirectories whose name contains "venv" (e.g. `venv`, `.venv`) are pruned without being listed; the directories
+    above `directory` are not checked.
+
+    Args:
+        directory (str): The directory to walk.
+        include_venv (bool, optional): Whether to include venv directories. Defaults to False.
+        exclude_dirs (Iterable[str], optional): Names of directories to skip, matched against whole names rather than
+            substrings of the path. Defaults to ().
+
+    Yields:
+        str: The path of each Python file, files of a directory before those of its subdirectories.
+    """
+    # Iterative depth-first walk: no recursion limit on deep trees and no chain of nested generators to resume per path.
+    # Subdirectories are pushed in reverse so they are visited in listing order.
+    # Normalized so that names given with a trailing separator (e.g. `build/`) still match
+    exclude = frozenset(os.path.normpath(d) for d in exclude_dirs)
+    stack = [directory]
+    while stack:
+        path = stack.pop()
+        subdirs = []
+        files = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    name = entry.name
+                    if name[-3:] == '.py':
+                        try:
+                            is_source = not entry.is_dir()
+                        except OSError:
+                            # A symlink loop; reported when it is analyzed, like a dangling symlink
+                            is_source = True
+                        if is_source:
+                            files.append(entry.path)
+                            continue
+                    if entry.is_dir(follow_symlinks=False):
+                        # Bytecode caches never hold sources
+                        if name != '__pycache__' and name not in exclude and (include_venv or "venv" not in name):
+                            subdirs.append(entry.path)
+        except OSError:
+            continue
+
+        yield from files
+        stack.extend(reversed(subdirs))
+
+
+# Analyzer shared by every file a worker process handles, and whether to hash the files it parses; set by _init_worker
+_worker_analyzer: Optional[PythonCodeAnalyzer] = None
+_worker_hash_sources = False
+
+
+def _init_worker(include_class_attrs: bool, include_docstrings: bool, docstrings_only: bool,
+                 hash_sources: bool) -> None:
+    """
+    Worker process initializer for `PythonCodeAnalyzer.analyze_python_directory`.
+
+    Args:
+        include_class_attrs (bool): Whether to include class attributes in the analysis.
+        include_docstrings (bool): Whether to extract docstrings.
+        docstrings_only (bool): Whether to only extract docstrings.
+        hash_sources (bool): Whether to return the digest of each file's contents, for the parent's on-disk cache.
+    """
+    global _worker_analyzer, _worker_hash_sources
+    _worker_hash_sources = hash_sources
+    _worker_analyzer = PythonCodeAnalyzer(include_class_attrs, include_docstrings=include_docstrings,
+                                          docstrings_only=docstrings_only)
+
+
+def _submit_batch(executor: ProcessPoolExecutor, batch: Deque[List[Any]]) -> None:
+    """
+    Send the queued misses of `PythonCodeAnalyzer.analyze_python_directory` to the worker pool as one task.
+
+    Args:
+        executor (ProcessPoolExecutor): The worker pool.
+        batch (Deque[List[Any]]): The queued jobs; each gets the task's Future and its position in it, and the deque is
+            emptied.
+    """
+    if not batch:
+        return
+    future = executor.submit(_analyze_batch, [job[0] for job in batch])
+    for index, job in enumerate(batch):
+        job[4] = future
+        job[5] = index
+    batch.clear()
+
+
+def _analyze_batch(filepaths: List[str]) -> List[Union[Tuple[Dict[str, Any], Optional[str]], ValueError]]:
+    """
+    Worker entry point for `PythonCodeAnalyzer.analyze_python_directory`.
+
+    Args:
+        filepaths (List[str]): The paths of the Python files to analyze.
+
+    Returns:
+        List[Union[Tuple[Dict[str, Any], Optional[str]], ValueError]]: The function/method details and content digest
+        of each file, in order, or the error to raise for it, so that one broken file does not lose the results of the
+        others.
+    """
+    assert _worker_analyzer is not None, "_init_worker has not run in this process"
+    results: List[Union[Tuple[Dict[str, Any], Optional[str]], ValueError]] = []
+    for filepath in filepaths:
+        try:
+            results.append(_worker_analyzer._analyze_uncached(filepath, False, _worker_hash_sources))
+        except ValueError as e:
+            results.append(e)
+    return results
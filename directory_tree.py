@@ -4,7 +4,7 @@ A script to display the directory tree structure of a given path in the console.
 This script accepts a path and several optional parameters to customize the output. It walks through the directory tree
 and prints the structure in a clear and legible way. It provides options to exclude certain directories, filter files by
 type, limit the depth of the tree, include file sizes, include file modification times, and sort files by modification
-time.
+time (or leave them in directory order).
 
 This script uses the built-in `os` module for filesystem operations and the `argparse` module for command-line argument
 parsing. It also uses the `fnmatch` module to support file name filtering.
@@ -26,8 +26,141 @@ Date: 2023-06-02
 import os
 import argparse
 import fnmatch
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-def print_directory_structure(startpath, exclude_dirs=None, file_filter=None, max_depth=None, include_sizes=False, include_times=False, sort_by_time=False):
+# Number of lines collected before the output is written to stdout in one call
+OUTPUT_BATCH_LINES = 4096
+
+# Minimum number of subdirectories under the root before a parallel scan is worth its setup cost
+PARALLEL_MIN_SUBDIRS = 4
+
+# Whether a directory can be listed through an open descriptor, so its entries are stat'ed relative to it (fstatat)
+_SCANDIR_FD = os.scandir in os.supports_fd and os.stat in os.supports_dir_fd and hasattr(os, 'O_DIRECTORY')
+
+
+def _is_dir(entry):
+    """
+    Checks whether a directory entry is, or links to, a directory.
+
+    Args:
+        entry (os.DirEntry): The entry to check.
+
+    Returns:
+        bool: True for a directory, False for anything else, including a dangling or looping symlink.
+    """
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _stat(entry):
+    """
+    Stats a directory entry, following symlinks.
+
+    Args:
+        entry (os.DirEntry): The entry to stat.
+
+    Returns:
+        os.stat_result: The stat of the entry, or of the link itself for a dangling or looping symlink.
+    """
+    try:
+        return entry.stat()
+    except OSError:
+        return entry.stat(follow_symlinks=False)
+
+
+def _scan_dir(path, exclude_dirs, file_match, need_stat):
+    """
+    Reads a single directory listing.
+
+    Args:
+        path (str): The directory to read.
+        exclude_dirs (frozenset[str]): Directory names to leave out of the listing.
+        file_match (callable): Compiled file name filter (a `re.Pattern.match`), or None to keep every file.
+        need_stat (bool): Whether to stat the remaining files.
+
+    Returns:
+        tuple | None: A ([(subdirectory name, path)], {file name: os.stat_result or None}) pair, or None if the
+        directory cannot be read.
+    """
+    # When the files will be stat'ed, list the directory through a descriptor: DirEntry.stat() then stats each file
+    # relative to it instead of resolving the full path again, and one open serves both the listing and the stats.
+    # Otherwise DirEntry.stat() uses the cached result where the platform provides one (Windows).
+    fd = None
+
+    # Split the listing into subdirectories and files in a single pass over the entries
+    dirs = []
+    files = {}
+    try:
+        if need_stat and _SCANDIR_FD:
+            fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        with os.scandir(path if fd is None else fd) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    # Exclude directories specified in exclude_dirs
+                    if entry.name not in exclude_dirs:
+                        dirs.append((entry.name, os.path.join(path, entry.name)))
+                elif not entry.is_symlink() or not _is_dir(entry):
+                    # Symlinked directories are not followed, matching os.walk
+                    files[entry.name] = entry
+    except OSError:
+        if fd is not None:
+            os.close(fd)
+        return None
+
+    try:
+        # Filter files if needed
+        names = list(files)
+        if file_match:
+            names = [f for f in names if file_match(f)]
+
+        # Stat the remaining files once and reuse the results for sizes, times and sorting
+        if need_stat:
+            return dirs, {f: _stat(files[f]) for f in names}
+        return dirs, dict.fromkeys(names)
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+
+def _parallel_walk(startpath, scan, root_listing, max_depth=None, workers=None):
+    """
+    Reads every directory below an already scanned root using a pool of worker threads.
+
+    The walk is bound by syscall latency rather than CPU, so overlapping the scandir/stat calls of several directories
+    shortens it on large trees.
+
+    Args:
+        startpath (str): The root directory.
+        scan (callable): Function mapping a directory path to its listing, as returned by `_scan_dir`.
+        root_listing (tuple): The listing of `startpath`.
+        max_depth (int, optional): Deepest level to read. Defaults to None (no limit).
+        workers (int, optional): Number of worker threads. Defaults to the executor's default.
+
+    Returns:
+        dict: Directory path to listing for every reachable directory down to `max_depth`.
+    """
+    listings = {startpath: root_listing}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Each pending scan remembers its path and depth, so neither has to be recovered from the path string
+        pending = {}
+        if max_depth is None or max_depth >= 1:
+            pending = {executor.submit(scan, d): (d, 1) for _, d in root_listing[0]}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, level = pending.pop(future)
+                listing = listings[path] = future.result()
+                if listing is not None and (max_depth is None or level < max_depth):
+                    for _, d in listing[0]:
+                        pending[executor.submit(scan, d)] = (d, level + 1)
+    return listings
+
+
+def print_directory_structure(startpath, exclude_dirs=None, file_filter=None, max_depth=None, include_sizes=False, include_times=False, sort_by_time=False, jobs=1, sort_by_name=True):
     """
     Recursively displays the directory tree structure starting from the specified path.
 
@@ -39,6 +172,10 @@ def print_directory_structure(startpath, exclude_dirs=None, file_filter=None, ma
         include_sizes (bool, optional): Flag to include file sizes in the output. Defaults to False.
         include_times (bool, optional): Flag to include file modification times in the output. Defaults to False.
         sort_by_time (bool, optional): Flag to sort files by modification time. Defaults to False.
+        jobs (int, optional): Number of threads used to scan the tree. Only used when the root has more than
+            PARALLEL_MIN_SUBDIRS subdirectories. Defaults to 1.
+        sort_by_name (bool, optional): Flag to sort files by name when they are not sorted by modification time. When
+            False, files are listed in the order the OS returns them, which skips a sort per directory. Defaults to True.
 
     Returns:
         None
@@ -50,44 +187,91 @@ def print_directory_structure(startpath, exclude_dirs=None, file_filter=None, ma
 
     # Normalize startpath and exclude_dirs for the current OS
     startpath = os.path.normpath(startpath)
-    exclude_dirs = [os.path.normpath(d) for d in exclude_dirs]
+    exclude_dirs = frozenset(os.path.normpath(d) for d in exclude_dirs)
 
-    # Print root directory
-    print(os.path.basename(startpath))
-    for root, dirs, files in os.walk(startpath):
-        # Exclude directories specified in exclude_dirs
-        dirs[:] = [d for d in dirs if d not in exclude_dirs]
+    # Translate the glob once instead of per directory, matching case-insensitively where the OS does (as fnmatch does)
+    file_match = None
+    if file_filter:
+        flags = re.IGNORECASE if os.path.normcase('A') == 'a' else 0
+        file_match = re.compile(fnmatch.translate(file_filter), flags).match
 
-        level = root.replace(startpath, '').count(os.sep)
-        if max_depth is not None and level > max_depth:
-            continue
+    # Lines are collected and written in batches rather than printed one by one
+    out = sys.stdout
+    buf = []
 
-        indent = ' ' * 4 * (level - 1)
-        subindent = ' ' * 4 * level
+    def emit(line):
+        buf.append(line)
+        if len(buf) >= OUTPUT_BATCH_LINES:
+            flush()
+
+    def flush():
+        if buf:
+            out.write('\n'.join(buf))
+            out.write('\n')
+            buf.clear()
+
+    def details(st):
+        if include_sizes and include_times:
+            return f"{st.st_size} bytes Modified: {st.st_mtime}"
+        if include_sizes:
+            return f"{st.st_size} bytes"
+        return f"Modified: {st.st_mtime}"
+
+    need_stat = include_sizes or include_times or sort_by_time
+
+    def scan(path):
+        return _scan_dir(path, exclude_dirs, file_match, need_stat)
+
+    listings = {}
+    root_listing = scan(startpath)
+    if jobs > 1 and root_listing is not None and len(root_listing[0]) > PARALLEL_MIN_SUBDIRS:
+        listings = _parallel_walk(startpath, scan, root_listing, max_depth, jobs)
+    else:
+        listings[startpath] = root_listing
+
+    # indents[level] is the indentation of the entries at that level, built once per depth rather than per directory
+    indents = ['']
+
+    def _walk(path, name, level):
+        listing = listings.pop(path) if path in listings else scan(path)
+        if listing is None:
+            return
+        dirs, stats = listing
+
+        # The walk goes one level deeper at a time, so at most one indentation is missing
+        if level == len(indents):
+            indents.append(indents[-1] + '    ')
+        subindent = indents[level]
 
         # Print directory
         if level > 0:
-            print('{}├───{}/'.format(indent, os.path.basename(root)))
-
-        # Filter files if needed
-        if file_filter:
-            files = fnmatch.filter(files, file_filter)
+            emit(f"{indents[level - 1]}├───{name}/")
 
-        # Sort files by modification time if needed
+        # Sort files by modification time if needed, otherwise by name unless directory order was asked for
+        names = list(stats)
         if sort_by_time:
-            files.sort(key=lambda x: os.path.getmtime(os.path.join(root, x)))
+            names.sort(key=lambda x: (stats[x].st_mtime, x))
+        elif sort_by_name:
+            names.sort()
 
-        # Print files
-        for i, f in enumerate(sorted(files)):
-            details = []
-            if include_sizes:
-                size = os.path.getsize(os.path.join(root, f))
-                details.append(f"{size} bytes")
-            if include_times:
-                mtime = os.path.getmtime(os.path.join(root, f))
-                details.append(f"Modified: {mtime}")
-            prefix = '├───' if i != len(files) - 1 else '└───'
-            print('{}{}{} {}'.format(subindent, prefix, f, ' '.join(details)))
+        # Print files; only the last one gets the closing connector
+        labels = [f"{f} {details(stats[f])}" for f in names] if include_sizes or include_times else names
+        if labels:
+            for label in labels[:-1]:
+                emit(f"{subindent}├───{label}")
+            emit(f"{subindent}└───{labels[-1]}")
+
+        # Stop descending at max_depth, so directories below it are never even opened
+        if max_depth is None or level < max_depth:
+            for dir_name, d in dirs:
+                _walk(d, dir_name, level + 1)
+
+    # Print root directory
+    emit(os.path.basename(startpath))
+    try:
+        _walk(startpath, None, 0)
+    finally:
+        flush()
 
 
 def process_paths(path):
@@ -105,7 +289,10 @@ if __name__ == "__main__":
     parser.add_argument("-s", "--sizes", action='store_true', help="Include file sizes in the output")
     parser.add_argument("-t", "--times", action='store_true', help="Include file modification times in the output")
     parser.add_argument("--sort", action='store_true', help="Sort files by modification time")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of threads used to scan large trees. Defaults to 1.")
+    parser.add_argument("-U", "--unsorted", action='store_true', help="List files in directory order instead of sorting them by name")
 
     args = parser.parse_args()
 
-    print_directory_structure(args.startpath, args.exclude, args.filter, args.depth, args.sizes, args.times, args.sort)
+    print_directory_structure(args.startpath, args.exclude, args.filter, args.depth, args.sizes, args.times, args.sort, args.jobs,
+                              not args.unsorted)
@@ -0,0 +1,20 @@
+"""
+Optional build step that compiles `analyzer_core.py` to a C extension with mypyc.
+
+The scripts run unchanged without it. To build the extension next to the sources:
+
+    pip install mypy setuptools
+    python setup.py build_ext --inplace
+
+Python then imports the compiled `analyzer_core` instead of the source file. Delete the generated
+`analyzer_core.*.so` (or `.pyd`) to go back to the interpreted module.
+"""
+
+from setuptools import setup
+from mypyc.build import mypycify
+
+setup(
+    name='analyzer_core',
+    py_modules=[],
+    ext_modules=mypycify(['analyzer_core.py']),
+)
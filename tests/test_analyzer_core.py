@@ -0,0 +1,246 @@
+"""
+Tests for the caching, locking and docstring helpers of `analyzer_core.py`.
+
+Run from the repository root with:
+    python -m unittest discover tests
+
+The same tests apply to the module compiled with mypyc (see setup.py), which is imported instead when it has been built
+next to the sources.
+"""
+
+import dbm
+import dbm.dumb
+import os
+import shelve
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from analyzer_core import (PARALLEL_MIN_FILES, PythonCodeAnalyzer, _leading_string, analyze_file,  # noqa: E402
+                           iter_python_files)
+
+
+class CountingAnalyzer(PythonCodeAnalyzer):
+    """
+    Analyzer that records the files it parses in-process.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parsed = []
+
+    def _analyze_uncached(self, filepath, keep=False, hash_source=False):
+        self.parsed.append(os.path.basename(filepath))
+        return super()._analyze_uncached(filepath, keep, hash_source)
+
+
+class TempDirTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = self.tmp.name
+        self.cache_path = os.path.join(self.path, 'cache', 'cache.db')
+
+    def write(self, name, source):
+        """
+        Writes a file under the temporary directory.
+
+        Args:
+            name (str): The file name, relative to the temporary directory.
+            source (str): The file contents.
+
+        Returns:
+            str: The path of the file.
+        """
+        filepath = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'w') as file:
+            file.write(source)
+        return filepath
+
+    def analyze(self, filepath):
+        """
+        Analyzes a file with a fresh analyzer on the on-disk cache, as a new run of the script would.
+
+        Args:
+            filepath (str): The path of the file.
+
+        Returns:
+            tuple[dict, list[str]]: The function/method details and the names of the files that had to be parsed.
+        """
+        analyzer = CountingAnalyzer(cache_path=self.cache_path)
+        try:
+            return analyzer.analyze_python_file(filepath), analyzer.parsed
+        finally:
+            analyzer.close()
+
+
+class CacheTest(TempDirTestCase):
+    def test_warm_cache_hit(self):
+        filepath = self.write('a.py', 'def f(x: int) -> int:\n    return abs(x)\n')
+        details, parsed = self.analyze(filepath)
+        self.assertEqual(parsed, ['a.py'])
+        self.assertEqual(self.analyze(filepath), (details, []))
+
+    def test_edit_invalidates_entry(self):
+        filepath = self.write('a.py', 'def f(): pass\n')
+        self.analyze(filepath)
+        self.write('a.py', 'def g(): pass\n\ndef h(): pass\n')
+        details, parsed = self.analyze(filepath)
+        self.assertEqual(parsed, ['a.py'])
+        self.assertEqual(sorted(details), ['g', 'h'])
+
+    def test_touched_file_hits_content_entry(self):
+        filepath = self.write('a.py', 'def f(): pass\n')
+        details, _ = self.analyze(filepath)
+        st = os.stat(filepath)
+        os.utime(filepath, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        self.assertEqual(self.analyze(filepath), (details, []))
+        # The path entry now carries the new stamp, so the next run needs no hashing either
+        with shelve.open(self.cache_path, 'r') as cache:
+            self.assertEqual(cache[os.path.abspath(filepath)][0][-2:], (st.st_mtime_ns + 10 ** 9, st.st_size))
+
+    def test_compaction_removes_stale_entries(self):
+        filepath = self.write('a.py', 'def f0(): pass\n')
+        analyzer = PythonCodeAnalyzer(cache_path=self.cache_path)
+        analyzer.analyze_python_file(filepath)
+        for i in range(1, 4):
+            self.write('a.py', f'def f{i}(): pass\n' * (i + 1))
+            analyzer.analyze_python_file(filepath)
+        if dbm.whichdb(self.cache_path) != 'dbm.dumb':
+            analyzer.close()
+            self.skipTest("only dbm.dumb caches are compacted")
+        size = os.path.getsize(self.cache_path + '.dat')
+        analyzer.close()
+
+        self.assertLess(os.path.getsize(self.cache_path + '.dat'), size)
+        db = dbm.dumb.open(self.cache_path, 'r')
+        try:
+            keys = sorted(key.decode() for key in db.keys())
+        finally:
+            db.close()
+        # Only the entries of the current contents survive; the superseded content entries and the count are gone
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(keys[0], os.path.abspath(filepath))
+        self.assertTrue(keys[1].startswith('sha256:'))
+        self.assertEqual(self.analyze(filepath)[1], [])
+
+    def test_locked_cache_falls_back(self):
+        filepath = self.write('a.py', 'def f(): pass\n')
+        check = ("import sys; sys.path.insert(0, sys.argv[1]); from analyzer_core import PythonCodeAnalyzer; "
+                 "a = PythonCodeAnalyzer(cache_path=sys.argv[2]); print(a.analyze_python_file(sys.argv[3]) != {}, "
+                 "a._open_cache() is not None); a.close()")
+
+        def run_other_process():
+            return subprocess.run([sys.executable, '-c', check, ROOT, self.cache_path, filepath],
+                                  capture_output=True, text=True, check=True).stdout.split()
+
+        holder = PythonCodeAnalyzer(cache_path=self.cache_path)
+        self.assertIsNotNone(holder._open_cache())
+        try:
+            self.assertEqual(run_other_process(), ['True', 'False'])
+        finally:
+            holder.close()
+        self.assertEqual(run_other_process(), ['True', 'True'])
+
+
+class DirectoryTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        # Enough misses for the worker pool to start when more than one worker is allowed
+        for i in range(PARALLEL_MIN_FILES * 2):
+            self.write(f'pkg/m{i:02}.py', f'def f{i}(): pass\n')
+
+    def walk(self, workers, cache_path):
+        """
+        Analyzes the temporary directory, collecting results up to the first error.
+
+        Args:
+            workers (int): Number of worker processes.
+            cache_path (str | None): The on-disk cache to use.
+
+        Returns:
+            tuple[list[tuple[str, dict]], ValueError | None]: The yielded results and the error raised, if any.
+        """
+        analyzer = PythonCodeAnalyzer(cache_path=cache_path)
+        results = []
+        try:
+            for result in analyzer.analyze_python_directory(self.path, workers=workers):
+                results.append(result)
+        except ValueError as e:
+            return results, e
+        finally:
+            analyzer.close()
+        return results, None
+
+    def test_results(self):
+        order = list(iter_python_files(self.path))
+        for workers in (1, 2):
+            for cache_path in (None, self.cache_path, self.cache_path):
+                results, error = self.walk(workers, cache_path)
+                self.assertIsNone(error)
+                self.assertEqual([filepath for filepath, _ in results], order)
+                for filepath, details in results:
+                    self.assertEqual(details, analyze_file(filepath))
+
+    def test_error_in_walk_order(self):
+        broken = os.path.join(self.path, 'pkg', 'broken.py')
+        os.symlink('nowhere.py', broken)
+        order = list(iter_python_files(self.path))
+        for workers in (1, 2):
+            for cache_path in (None, self.cache_path):
+                results, error = self.walk(workers, cache_path)
+                self.assertEqual(str(error), f"{broken} does not exist")
+                self.assertEqual([filepath for filepath, _ in results], order[:order.index(broken)])
+
+
+class LeadingStringTest(TempDirTestCase):
+    def check(self, source, expected):
+        """
+        Checks `_leading_string` and `get_module_docstring` on a module.
+
+        `_leading_string` may leave a module to the parser, but if it settles the question it must agree with it.
+
+        Args:
+            source (str): The module source.
+            expected (str | None): The expected module docstring.
+
+        Returns:
+            bool: Whether `_leading_string` settled the question from the tokens.
+        """
+        filepath = self.write('m.py', source)
+        settled, value = _leading_string(filepath)
+        if settled:
+            self.assertEqual(value, expected)
+        self.assertEqual(PythonCodeAnalyzer().get_module_docstring(filepath), expected)
+        return settled
+
+    def test_plain(self):
+        self.assertTrue(self.check('"""Doc."""\nx = 1\n', 'Doc.'))
+
+    def test_concatenated(self):
+        self.assertTrue(self.check('"Doc " \'string\' r"\\n"\n', 'Doc string\\n'))
+        self.assertTrue(self.check('"a" \\\n    "b"\n', 'ab'))
+
+    def test_parenthesized(self):
+        self.check('("Doc "\n "string")\n', 'Doc string')
+        self.check('("Doc")\n', 'Doc')
+
+    def test_fstring(self):
+        self.check('f"Doc {1}"\n', None)
+        self.check('"Doc" f"{1}"\n', None)
+
+    def test_bytes(self):
+        self.assertTrue(self.check('b"Doc"\n', None))
+
+    def test_expression(self):
+        self.assertTrue(self.check('"Doc %s" % 1\n', None))
+        self.assertTrue(self.check('x = "Doc"\n', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+"""
+Tests for the directory listing helpers of `directory_tree.py`.
+
+Run from the repository root with:
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import directory_tree  # noqa: E402
+
+
+@unittest.skipUnless(hasattr(os, 'symlink'), "needs symlinks")
+class ScanDirTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = self.tmp.name
+        os.mkdir(os.path.join(self.path, 'sub'))
+        open(os.path.join(self.path, 'a.txt'), 'w').close()
+        os.symlink('nowhere', os.path.join(self.path, 'dangling'))
+        os.symlink('loop', os.path.join(self.path, 'loop'))
+
+    def test_broken_symlinks_are_listed(self):
+        for need_stat in (False, True):
+            dirs, stats = directory_tree._scan_dir(self.path, frozenset(), None, need_stat)
+            self.assertEqual(dirs, [('sub', os.path.join(self.path, 'sub'))])
+            self.assertEqual(sorted(stats), ['a.txt', 'dangling', 'loop'])
+        self.assertEqual(stats['dangling'].st_size, len('nowhere'))
+
+
+if __name__ == '__main__':
+    unittest.main()